@@ -1,7 +1,27 @@
 """
 Policy Compliance RAG System - Streamlit Application
-"
+"""
+
+import json
+import os
+import faiss
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from compliance_checker import ComplianceChecker, GeminiLLM, MmapFAISS
+from onnx_embeddings import ONNX_MODEL_DIR, QUANTIZED_MODEL_FILE, OnnxMiniLMEmbeddings
 
+# Suggested compliance queries (label, query)
+SUGGESTED_QUERIES = [
+    ("Check Party Identification", "Are the contracting parties clearly identified?"),
+    ("Check Effective Dates", "Do contracts specify effective dates?"),
+    ("Check Termination Clauses", "What are the termination provisions in the contracts?"),
+    ("Check Governing Law", "Are governing law clauses present?"),
+    ("Check Liability Caps", "Do contracts define liability caps?"),
+    ("Check IP Ownership", "Are IP ownership terms clearly defined?"),
+]
 
 # Page configuration
 st.set_page_config(
@@ -33,22 +53,49 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 @st.cache_resource
-def load_resources(api_key):
-    """Load all necessary resources"""
+def load_rules(path):
+    """Load compliance rules once, shared across sessions (treat as read-only)"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+@st.cache_resource
+def get_embeddings():
+    """Load the embedding model once, independent of the API key"""
     
-    # Initialize embeddings
-    embeddings = HuggingFaceEmbeddings(
+    # Let FAISS search use every core (process-wide, so set it once here)
+    faiss.omp_set_num_threads(os.cpu_count() or 1)
+    
+    # Leave cores free for FAISS's OpenMP threads
+    num_threads = max(1, (os.cpu_count() or 1) // 2)
+    
+    # int8 ONNX model when exported, PyTorch otherwise
+    if os.path.exists(os.path.join(ONNX_MODEL_DIR, QUANTIZED_MODEL_FILE)):
+        return OnnxMiniLMEmbeddings(ONNX_MODEL_DIR, num_threads=num_threads)
+    
+    import torch
+    torch.set_num_threads(num_threads)
+    return HuggingFaceEmbeddings(
         model_name="sentence-transformers/all-MiniLM-L6-v2",
         model_kwargs={'device': 'cpu'}
     )
+
+@st.cache_resource
+def load_resources(api_key):
+    """Load all necessary resources"""
+    
+    # Initialize embeddings
+    embeddings = get_embeddings()
     
     # Load vector store
-    vectorstore = FAISS.load_local(
+    vectorstore = MmapFAISS.load_local_mmap(
         "models/vectorstore",
-        embeddings,
-        allow_dangerous_deserialization=True
+        embeddings
     )
     
+    # Tune recall/latency for quantized IVF indexes
+    if hasattr(vectorstore.index, "nprobe"):
+        vectorstore.index.nprobe = 16
+    
     # Initialize LLM
     llm = GeminiLLM(api_key=api_key)
     
@@ -56,9 +103,14 @@ def load_resources(api_key):
     checker = ComplianceChecker(
         vectorstore=vectorstore,
         llm=llm.model,
-        rules_path="data/compliance_rules.json"
+        rules=load_rules("data/compliance_rules.json"),
+        embeddings=embeddings
     )
     
+    # Precompute embeddings for the suggested queries
+    suggested = [query for _, query in SUGGESTED_QUERIES]
+    checker.suggested = dict(zip(suggested, embeddings.embed_documents(suggested)))
+    
     return vectorstore, llm, checker
 
 @st.cache_data
@@ -66,17 +118,60 @@ def load_data():
     """Load analysis results"""
     
     # Load comparison data
-    comparison_df = pd.read_csv("compliance_comparison.csv")
+    comparison_df = pd.read_csv(
+        "compliance_comparison.csv",
+        engine='pyarrow',
+        dtype={'Status': 'category'}
+    )
     
-    # Load detailed results
-    with open("detailed_compliance_results.json", 'r') as f:
-        detailed_results = json.load(f)
+    # Parse compliance percentages once instead of on every rerun
+    comparison_df['Compliance_num'] = comparison_df['Compliance %'].str.rstrip('%').astype('float32')
     
-    # Load compliance rules
-    with open("compliance_rules.json", 'r') as f:
-        compliance_rules = json.load(f)
+    # Slice the worst offenders once for the analytics tabs
+    top10_violators = comparison_df.nlargest(10, 'Total Violations').reset_index(drop=True)
     
-    return comparison_df, detailed_results, compliance_rules
+    return comparison_df, top10_violators
+
+class CacheMiss(Exception):
+    """Raised by the response caches when nothing is stored for the key yet"""
+
+# Underscore arguments are not hashed, so _result only fills the (checker, query) entry;
+# exceptions are never cached, so a lookup without _result misses until it is stored
+@st.cache_data(ttl=3600, max_entries=200, show_spinner=False, hash_funcs={ComplianceChecker: id})
+def cached_check(checker, query, _result=None):
+    """Memoized compliance analysis per checker and query"""
+    if _result is None:
+        raise CacheMiss
+    return _result
+
+@st.cache_data(ttl=3600, max_entries=200, show_spinner=False, hash_funcs={ComplianceChecker: id})
+def cached_answer(checker, question, _result=None):
+    """Memoized Q&A answer per checker and question"""
+    if _result is None:
+        raise CacheMiss
+    return _result
+
+def show_check(checker, query):
+    """Render a compliance analysis, streaming it from the LLM on a cache miss"""
+    try:
+        result = cached_check(checker, query)
+        st.markdown(result['response'])
+    except CacheMiss:
+        result = checker.check_compliance_stream(query)
+        result['response'] = st.write_stream(result.pop('chunks'))
+        cached_check(checker, query, _result=result)
+    return result
+
+def show_answer(checker, question):
+    """Render a Q&A answer, streaming it from the LLM on a cache miss"""
+    try:
+        result = cached_answer(checker, question)
+        st.markdown(result['answer'])
+    except CacheMiss:
+        result = checker.answer_question_stream(question)
+        result['answer'] = st.write_stream(result.pop('chunks'))
+        cached_answer(checker, question, _result=result)
+    return result
 
 def main():
     """Main application"""
@@ -113,7 +208,8 @@ def main():
     # Load resources
     try:
         vectorstore, llm, checker = load_resources(api_key)
-        comparison_df, detailed_results, compliance_rules = load_data()
+        comparison_df, top10_violators = load_data()
+        compliance_rules = load_rules("data/compliance_rules.json")
     except Exception as e:
         st.error(f"❌ Error loading resources: {str(e)}")
         st.info("💡 Make sure all data files are in the correct folders")
@@ -121,7 +217,7 @@ def main():
     
     # Page routing
     if page == "🏠 Dashboard":
-        show_dashboard(comparison_df, detailed_results, compliance_rules)
+        show_dashboard(comparison_df, compliance_rules)
     
     elif page == "🔍 Compliance Checker":
         show_compliance_checker(checker)
@@ -130,36 +226,152 @@ def main():
         show_qa_system(checker)
     
     elif page == "📊 Analytics":
-        show_analytics(comparison_df, detailed_results)
+        show_analytics(comparison_df, top10_violators)
     
     elif page == "📋 Rules Explorer":
         show_rules_explorer(compliance_rules)
 
-def show_dashboard(comparison_df, detailed_results, compliance_rules):
+@st.cache_data
+def make_compliance_hist(comparison_df):
+    """Histogram of compliance scores"""
+    return px.histogram(
+        comparison_df,
+        x='Compliance %',
+        nbins=20,
+        title="Distribution of Compliance Scores",
+        labels={'Compliance %': 'Compliance Percentage'},
+        color_discrete_sequence=['#1f77b4']
+    )
+
+@st.cache_data
+def make_status_pie(comparison_df):
+    """Pie chart of compliance status counts"""
+    status_counts = comparison_df['Status'].value_counts()
+    return px.pie(
+        values=status_counts.values,
+        names=status_counts.index,
+        title="Overall Compliance Status",
+        color_discrete_sequence=['#2ecc71', '#e74c3c']
+    )
+
+@st.cache_data
+def make_severity_bar(severity_data):
+    """Bar chart of total violations per severity level"""
+    return px.bar(
+        severity_data,
+        x='Severity',
+        y='Count',
+        title="Total Violations by Severity Level",
+        color='Severity',
+        color_discrete_map={'High': '#e74c3c', 'Medium': '#f39c12', 'Low': '#f1c40f'}
+    )
+
+@st.cache_data
+def make_compliance_box(comparison_df):
+    """Box plot of compliance scores"""
+    fig = go.Figure()
+    fig.add_trace(go.Box(
+        y=comparison_df['Compliance_num'],
+        name='Compliance %',
+        marker_color='lightblue'
+    ))
+    fig.update_layout(
+        title="Compliance Score Distribution (Box Plot)",
+        yaxis_title="Compliance %"
+    )
+    return fig
+
+@st.cache_data
+def make_top_violators_bar(top_violators):
+    """Horizontal bar chart of the contracts with most violations"""
+    fig = px.bar(
+        top_violators,
+        x='Total Violations',
+        y='Filename',
+        orientation='h',
+        title="Contracts with Most Violations",
+        color='Total Violations',
+        color_continuous_scale='Reds'
+    )
+    fig.update_layout(height=500)
+    return fig
+
+@st.cache_data
+def make_severity_stack(top_violators):
+    """Stacked bar chart of violation severities per contract"""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        name='High',
+        x=top_violators['Filename'],
+        y=top_violators['High Severity'],
+        marker_color='#e74c3c'
+    ))
+    fig.add_trace(go.Bar(
+        name='Medium',
+        x=top_violators['Filename'],
+        y=top_violators['Medium Severity'],
+        marker_color='#f39c12'
+    ))
+    fig.add_trace(go.Bar(
+        name='Low',
+        x=top_violators['Filename'],
+        y=top_violators['Low Severity'],
+        marker_color='#f1c40f'
+    ))
+    
+    fig.update_layout(
+        barmode='stack',
+        title='Severity Breakdown (Top 10 Violators)',
+        xaxis_tickangle=-45,
+        height=500
+    )
+    return fig
+
+@st.cache_data
+def make_rules_df(compliance_rules):
+    """Table of compliance rules indexed by rule id"""
+    columns = ['name', 'severity', 'description', 'check', 'remediation', 'related_columns']
+    if not compliance_rules:
+        return pd.DataFrame(columns=columns)
+    
+    rules_df = pd.DataFrame.from_dict(compliance_rules, orient='index')
+    rules_df['related_columns'] = rules_df['related_columns'].str.join(', ')
+    return rules_df[columns]
+
+def show_dashboard(comparison_df, compliance_rules):
     """Dashboard page"""
     
     st.header("📊 Executive Dashboard")
     
-    # Key metrics
+    # Key metrics, computed in a single aggregation
+    metrics = comparison_df.agg(
+        total_contracts=('Total Violations', 'size'),
+        compliant_count=('Total Violations', lambda v: (v == 0).sum()),
+        total_violations=('Total Violations', 'sum'),
+        avg_compliance=('Compliance_num', 'mean')
+    ).stack().droplevel(1)
+    total_contracts = int(metrics['total_contracts'])
+    compliant_count = int(metrics['compliant_count'])
+    total_violations = int(metrics['total_violations'])
+    avg_compliance = metrics['avg_compliance']
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.metric(
             label="Total Contracts",
-            value=len(comparison_df),
+            value=total_contracts,
             delta=None
         )
     
     with col2:
-        compliant_count = len(comparison_df[comparison_df['Total Violations'] == 0])
         st.metric(
             label="Fully Compliant",
             value=compliant_count,
-            delta=f"{compliant_count/len(comparison_df)*100:.1f}%"
+            delta=f"{compliant_count/total_contracts*100:.1f}%"
         )
     
     with col3:
-        avg_compliance = comparison_df['Compliance %'].str.rstrip('%').astype(float).mean()
         st.metric(
             label="Avg Compliance",
             value=f"{avg_compliance:.1f}%",
@@ -167,7 +379,6 @@ def show_dashboard(comparison_df, detailed_results, compliance_rules):
         )
     
     with col4:
-        total_violations = comparison_df['Total Violations'].sum()
         st.metric(
             label="Total Violations",
             value=total_violations,
@@ -181,25 +392,12 @@ def show_dashboard(comparison_df, detailed_results, compliance_rules):
     
     with col1:
         st.subheader("📈 Compliance Distribution")
-        fig = px.histogram(
-            comparison_df,
-            x='Compliance %',
-            nbins=20,
-            title="Distribution of Compliance Scores",
-            labels={'Compliance %': 'Compliance Percentage'},
-            color_discrete_sequence=['#1f77b4']
-        )
+        fig = make_compliance_hist(comparison_df)
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         st.subheader("🎯 Compliance Status")
-        status_counts = comparison_df['Status'].value_counts()
-        fig = px.pie(
-            values=status_counts.values,
-            names=status_counts.index,
-            title="Overall Compliance Status",
-            color_discrete_sequence=['#2ecc71', '#e74c3c']
-        )
+        fig = make_status_pie(comparison_df)
         st.plotly_chart(fig, use_container_width=True)
     
     st.markdown("---")
@@ -207,23 +405,13 @@ def show_dashboard(comparison_df, detailed_results, compliance_rules):
     # Severity breakdown
     st.subheader("⚠️ Violations by Severity")
     
+    severity_totals = comparison_df[['High Severity', 'Medium Severity', 'Low Severity']].sum()
     severity_data = pd.DataFrame({
         'Severity': ['High', 'Medium', 'Low'],
-        'Count': [
-            comparison_df['High Severity'].sum(),
-            comparison_df['Medium Severity'].sum(),
-            comparison_df['Low Severity'].sum()
-        ]
+        'Count': severity_totals.values
     })
     
-    fig = px.bar(
-        severity_data,
-        x='Severity',
-        y='Count',
-        title="Total Violations by Severity Level",
-        color='Severity',
-        color_discrete_map={'High': '#e74c3c', 'Medium': '#f39c12', 'Low': '#f1c40f'}
-    )
+    fig = make_severity_bar(severity_data)
     st.plotly_chart(fig, use_container_width=True)
     
     # Recent contracts table
@@ -240,33 +428,25 @@ def show_compliance_checker(checker):
     # Predefined queries
     st.subheader("💡 Suggested Queries")
     
-    col1, col2 = st.columns(2)
+    labels = {query: label for label, query in SUGGESTED_QUERIES}
     
-    with col1:
-        if st.button("Check Party Identification"):
-            query = "Are the contracting parties clearly identified?"
-            st.session_state.compliance_query = query
-        
-        if st.button("Check Effective Dates"):
-            query = "Do contracts specify effective dates?"
-            st.session_state.compliance_query = query
-        
-        if st.button("Check Termination Clauses"):
-            query = "What are the termination provisions in the contracts?"
-            st.session_state.compliance_query = query
+    def use_suggested_query():
+        st.session_state.compliance_query = st.session_state.suggested_query
     
-    with col2:
-        if st.button("Check Governing Law"):
-            query = "Are governing law clauses present?"
-            st.session_state.compliance_query = query
-        
-        if st.button("Check Liability Caps"):
-            query = "Do contracts define liability caps?"
-            st.session_state.compliance_query = query
-        
-        if st.button("Check IP Ownership"):
-            query = "Are IP ownership terms clearly defined?"
-            st.session_state.compliance_query = query
+    def clear_query():
+        # Reset the suggestion too, so picking it again fires on_change
+        st.session_state.compliance_query = ''
+        st.session_state.suggested_query = None
+    
+    st.selectbox(
+        "Suggested queries",
+        options=list(labels),
+        index=None,
+        format_func=labels.get,
+        placeholder="Choose a suggested query",
+        key="suggested_query",
+        on_change=use_suggested_query
+    )
     
     st.markdown("---")
     
@@ -286,23 +466,17 @@ def show_compliance_checker(checker):
         check_button = st.button("🔍 Check Compliance", type="primary", use_container_width=True)
     
     with col2:
-        clear_button = st.button("🗑️ Clear", use_container_width=True)
-    
-    if clear_button:
-        st.session_state.compliance_query = ''
-        st.rerun()
+        st.button("🗑️ Clear", use_container_width=True, on_click=clear_query)
     
     if check_button and query:
         with st.spinner("🔍 Analyzing contracts..."):
             try:
-                result = checker.check_compliance(query)
+                # Display results as they stream in
+                st.subheader("📋 Compliance Analysis")
+                result = show_check(checker, query)
                 
                 st.success("✅ Analysis Complete!")
                 
-                # Display results
-                st.subheader("📋 Compliance Analysis")
-                st.markdown(result['response'])
-                
                 # Display sources
                 with st.expander("📄 View Sources"):
                     st.write(f"**Documents Analyzed:** {result['num_sources']}")
@@ -323,6 +497,12 @@ def show_qa_system(checker):
     if 'messages' not in st.session_state:
         st.session_state.messages = []
     
+    chat_panel(checker)
+
+@st.fragment
+def chat_panel(checker):
+    """Chat history, input and answers, rerun on their own without the rest of the page"""
+    
     # Display chat history
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
@@ -339,11 +519,10 @@ def show_qa_system(checker):
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 try:
-                    result = checker.answer_question(question)
+                    # Answer is rendered as it streams in
+                    result = show_answer(checker, question)
                     response = result['answer']
                     
-                    st.markdown(response)
-                    
                     # Show sources
                     with st.expander("📚 Sources"):
                         for i, source in enumerate(result['sources'][:3], 1):
@@ -360,9 +539,9 @@ def show_qa_system(checker):
     # Clear chat button
     if st.button("🗑️ Clear Chat History"):
         st.session_state.messages = []
-        st.rerun()
+        st.rerun(scope="fragment")
 
-def show_analytics(comparison_df, detailed_results):
+def show_analytics(comparison_df, top_violators):
     """Analytics page"""
     
     st.header("📊 Detailed Analytics")
@@ -374,18 +553,9 @@ def show_analytics(comparison_df, detailed_results):
         st.subheader("Compliance Trends")
         
         # Compliance distribution
-        compliance_values = comparison_df['Compliance %'].str.rstrip('%').astype(float)
+        compliance_values = comparison_df['Compliance_num']
         
-        fig = go.Figure()
-        fig.add_trace(go.Box(
-            y=compliance_values,
-            name='Compliance %',
-            marker_color='lightblue'
-        ))
-        fig.update_layout(
-            title="Compliance Score Distribution (Box Plot)",
-            yaxis_title="Compliance %"
-        )
+        fig = make_compliance_box(comparison_df)
         st.plotly_chart(fig, use_container_width=True)
         
         # Statistics
@@ -400,18 +570,7 @@ def show_analytics(comparison_df, detailed_results):
     with tab2:
         st.subheader("Top 10 Most Non-Compliant Contracts")
         
-        top_violators = comparison_df.nlargest(10, 'Total Violations')
-        
-        fig = px.bar(
-            top_violators,
-            x='Total Violations',
-            y='Filename',
-            orientation='h',
-            title="Contracts with Most Violations",
-            color='Total Violations',
-            color_continuous_scale='Reds'
-        )
-        fig.update_layout(height=500)
+        fig = make_top_violators_bar(top_violators)
         st.plotly_chart(fig, use_container_width=True)
         
         # Detailed table
@@ -424,34 +583,7 @@ def show_analytics(comparison_df, detailed_results):
         st.subheader("Violation Severity Breakdown")
         
         # Stacked bar chart
-        top_10 = comparison_df.nlargest(10, 'Total Violations')
-        
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            name='High',
-            x=top_10['Filename'],
-            y=top_10['High Severity'],
-            marker_color='#e74c3c'
-        ))
-        fig.add_trace(go.Bar(
-            name='Medium',
-            x=top_10['Filename'],
-            y=top_10['Medium Severity'],
-            marker_color='#f39c12'
-        ))
-        fig.add_trace(go.Bar(
-            name='Low',
-            x=top_10['Filename'],
-            y=top_10['Low Severity'],
-            marker_color='#f1c40f'
-        ))
-        
-        fig.update_layout(
-            barmode='stack',
-            title='Severity Breakdown (Top 10 Violators)',
-            xaxis_tickangle=-45,
-            height=500
-        )
+        fig = make_severity_stack(top_violators)
         st.plotly_chart(fig, use_container_width=True)
 
 def show_rules_explorer(compliance_rules):
@@ -466,23 +598,34 @@ def show_rules_explorer(compliance_rules):
         default=['HIGH', 'MEDIUM', 'LOW']
     )
     
-    # Display rules
-    for rule_id, rule in compliance_rules.items():
-        if rule['severity'] in severity_filter:
-            severity_color = {
-                'HIGH': '🔴',
-                'MEDIUM': '🟡',
-                'LOW': '🟢'
-            }
+    severity_color = {
+        'HIGH': '🔴',
+        'MEDIUM': '🟡',
+        'LOW': '🟢'
+    }
+    
+    # Display all matching rules in one table
+    rules_df = make_rules_df(compliance_rules)
+    filtered = rules_df[rules_df['severity'].isin(severity_filter)]
+    event = st.dataframe(
+        filtered,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row"
+    )
+    
+    # Details for the selected rule
+    if event.selection.rows:
+        selected = filtered.index[event.selection.rows[0]]
+        rule = compliance_rules[selected]
+        with st.expander(f"{severity_color[rule['severity']]} {selected}: {rule['name']}", expanded=True):
+            st.write(f"**Description:** {rule['description']}")
+            st.write(f"**Severity:** {rule['severity']}")
+            st.write(f"**Check:** {rule['check']}")
+            st.write(f"**Remediation:** {rule['remediation']}")
             
-            with st.expander(f"{severity_color[rule['severity']]} {rule_id}: {rule['name']}"):
-                st.write(f"**Description:** {rule['description']}")
-                st.write(f"**Severity:** {rule['severity']}")
-                st.write(f"**Check:** {rule['check']}")
-                st.write(f"**Remediation:** {rule['remediation']}")
-                
-                if rule['related_columns']:
-                    st.write(f"**Related Columns:** {', '.join(rule['related_columns'])}")
+            if rule['related_columns']:
+                st.write(f"**Related Columns:** {', '.join(rule['related_columns'])}")
 
 if __name__ == "__main__":
     main()
@@ -3,36 +3,20 @@ Compliance Checker Utility Functions
 """
 
 import json
+import os
+import pickle
+from functools import lru_cache
 from typing import Dict, List, Any
+import faiss
+import numpy as np
 import google.generativeai as genai
+from langchain_community.vectorstores import FAISS
 
-class ComplianceChecker:
-    """Handles compliance checking operations"""
-    
-    def __init__(self, vectorstore, llm, rules_path):
-        self.vectorstore = vectorstore
-        self.llm = llm
-        
-        # Load compliance rules
-        with open(rules_path, 'r') as f:
-            self.compliance_rules = json.load(f)
-    
-    def check_compliance(self, query: str, top_k: int = 5) -> Dict[str, Any]:
-        """
-        Check compliance based on query
-        """
-        # Retrieve relevant documents
-        relevant_docs = self.vectorstore.similarity_search(query, k=top_k)
-        
-        # Prepare context
-        context = "\n\n---\n\n".join([doc.page_content for doc in relevant_docs])
-        
-        # Create prompt
-        prompt = f"""
+COMPLIANCE_PROMPT_TEMPLATE = """
 You are a legal compliance expert analyzing contracts.
 
 COMPLIANCE RULES:
-{json.dumps(self.compliance_rules, indent=2)}
+{rules}
 
 CONTRACT SECTIONS:
 {context}
@@ -48,29 +32,8 @@ Provide a detailed compliance analysis with:
 
 Response:
 """
-        
-        # Get response
-        response = self.llm.generate_content(prompt)
-        
-        return {
-            "query": query,
-            "response": response.text,
-            "sources": [doc.metadata.get("filename", "Unknown") for doc in relevant_docs],
-            "num_sources": len(relevant_docs)
-        }
-    
-    def answer_question(self, question: str, top_k: int = 5) -> Dict[str, Any]:
-        """
-        Answer general questions about contracts
-        """
-        # Retrieve relevant documents
-        relevant_docs = self.vectorstore.similarity_search(question, k=top_k)
-        
-        # Prepare context
-        context = "\n\n---\n\n".join([doc.page_content for doc in relevant_docs])
-        
-        # Create prompt
-        prompt = f"""
+
+QA_PROMPT_TEMPLATE = """
 Based on the following contract information, answer the question accurately.
 
 CONTRACT INFORMATION:
@@ -82,13 +45,187 @@ Provide a clear, detailed answer with specific references.
 
 Answer:
 """
+
+class MmapFAISS(FAISS):
+    """FAISS vector store whose index is memory-mapped instead of read into RAM"""
+    
+    @classmethod
+    def load_local_mmap(cls, folder_path: str, embeddings, index_name: str = "index"):
+        """
+        Load a store saved with save_local, letting the OS page the index in on demand
+        """
+        index = faiss.read_index(
+            os.path.join(folder_path, f"{index_name}.faiss"),
+            faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        
+        # Docstore pickle is trusted, it is produced by our own save_local
+        with open(os.path.join(folder_path, f"{index_name}.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        
+        return cls(embeddings, index, docstore, index_to_docstore_id)
+
+class ComplianceChecker:
+    """Handles compliance checking operations"""
+    
+    def __init__(self, vectorstore, llm, rules: Dict[str, Any], embeddings, rules_top_k: int = 5):
+        self.vectorstore = vectorstore
+        self.llm = llm
+        self.embeddings = embeddings
+        self.rules_top_k = rules_top_k
+        
+        # Compliance rules, parsed once by the caller and shared
+        self.compliance_rules = rules
+        
+        # Index the rules so prompts only carry the ones relevant to a query
+        self._rule_ids = list(self.compliance_rules)
+        self._rules_index = None
+        if self._rule_ids:
+            rule_texts = [
+                f"{rule['name']}: {rule['description']} {rule['check']}"
+                for rule in self.compliance_rules.values()
+            ]
+            rule_vectors = np.asarray(embeddings.embed_documents(rule_texts), dtype='float32')
+            faiss.normalize_L2(rule_vectors)
+            self._rules_index = faiss.IndexFlatIP(rule_vectors.shape[1])
+            self._rules_index.add(rule_vectors)
+        
+        # Precomputed embeddings for known queries (query -> vector)
+        self.suggested = {}
+        
+        # Per-instance caches, so evicted checkers can be freed
+        self._embed_query = lru_cache(maxsize=256)(self._embed_query_uncached)
+        self._retrieve = lru_cache(maxsize=256)(self._retrieve_uncached)
+        self._relevant_rules = lru_cache(maxsize=256)(self._relevant_rules_uncached)
+    
+    def _embed_query_uncached(self, query: str):
+        """
+        Embed a query once, shared by document and rule retrieval
+        """
+        if query in self.suggested:
+            return self.suggested[query]
+        return self.embeddings.embed_query(query)
+    
+    def _retrieve_uncached(self, query: str, top_k: int):
+        """
+        Retrieve (page_content, filename) pairs, cached for repeat queries
+        """
+        relevant_docs = self.vectorstore.similarity_search_by_vector(
+            self._embed_query(query), k=top_k
+        )
+        return tuple(
+            (doc.page_content, doc.metadata.get("filename", "Unknown"))
+            for doc in relevant_docs
+        )
+    
+    def _relevant_rules_uncached(self, query: str) -> str:
+        """
+        Serialize the rules closest to the query for the prompt
+        """
+        if self._rules_index is None:
+            return "{}"
+        
+        query_vector = np.asarray([self._embed_query(query)], dtype='float32')
+        faiss.normalize_L2(query_vector)
+        _, indices = self._rules_index.search(query_vector, min(self.rules_top_k, len(self._rule_ids)))
+        
+        selected = {
+            self._rule_ids[i]: self.compliance_rules[self._rule_ids[i]]
+            for i in indices[0] if i >= 0
+        }
+        return json.dumps(selected, indent=2)
+    
+    @staticmethod
+    def _build_context(relevant_docs) -> str:
+        """
+        Join retrieved passages, skipping exact duplicates to keep the prompt small
+        """
+        seen = set()
+        unique = []
+        for content, _ in relevant_docs:
+            if content not in seen:
+                seen.add(content)
+                unique.append(content)
+        return "\n\n---\n\n".join(unique)
+    
+    def _compliance_prompt(self, query: str, top_k: int):
+        """
+        Build the compliance prompt and return it with the retrieved documents
+        """
+        # Retrieve relevant documents
+        relevant_docs = self._retrieve(query, top_k)
+        
+        # Prepare context
+        context = self._build_context(relevant_docs)
+        
+        # Create prompt
+        prompt = COMPLIANCE_PROMPT_TEMPLATE.format(
+            rules=self._relevant_rules(query),
+            context=context,
+            query=query
+        )
+        
+        return prompt, relevant_docs
+    
+    def _qa_prompt(self, question: str, top_k: int):
+        """
+        Build the Q&A prompt and return it with the retrieved documents
+        """
+        # Retrieve relevant documents
+        relevant_docs = self._retrieve(question, top_k)
+        
+        # Prepare context
+        context = self._build_context(relevant_docs)
+        
+        # Create prompt
+        prompt = QA_PROMPT_TEMPLATE.format(context=context, question=question)
+        
+        return prompt, relevant_docs
+    
+    def check_compliance(self, query: str, top_k: int = 5) -> Dict[str, Any]:
+        """
+        Check compliance based on query
+        """
+        result = self.check_compliance_stream(query, top_k)
+        result["response"] = "".join(result.pop("chunks"))
+        return result
+    
+    def check_compliance_stream(self, query: str, top_k: int = 5) -> Dict[str, Any]:
+        """
+        Check compliance based on query, streaming the response text in chunks
+        """
+        prompt, relevant_docs = self._compliance_prompt(query, top_k)
+        
+        # Get streamed response
+        response = self.llm.generate_content(prompt, stream=True)
+        
+        return {
+            "query": query,
+            "chunks": (chunk.text for chunk in response),
+            "sources": [filename for _, filename in relevant_docs],
+            "num_sources": len(relevant_docs)
+        }
+    
+    def answer_question(self, question: str, top_k: int = 5) -> Dict[str, Any]:
+        """
+        Answer general questions about contracts
+        """
+        result = self.answer_question_stream(question, top_k)
+        result["answer"] = "".join(result.pop("chunks"))
+        return result
+    
+    def answer_question_stream(self, question: str, top_k: int = 5) -> Dict[str, Any]:
+        """
+        Answer general questions about contracts, streaming the answer text in chunks
+        """
+        prompt, relevant_docs = self._qa_prompt(question, top_k)
         
-        response = self.llm.generate_content(prompt)
+        response = self.llm.generate_content(prompt, stream=True)
         
         return {
             "question": question,
-            "answer": response.text,
-            "sources": [doc.metadata.get("filename", "Unknown") for doc in relevant_docs]
+            "chunks": (chunk.text for chunk in response),
+            "sources": [filename for _, filename in relevant_docs]
         }
 
 class GeminiLLM:
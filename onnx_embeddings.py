@@ -0,0 +1,92 @@
+"""
+ONNX Runtime MiniLM Embeddings
+
+Usage: python onnx_embeddings.py [output_dir]
+
+Exporting needs the extra tools in requirements-export.txt.
+"""
+
+import os
+import sys
+from typing import List
+import numpy as np
+import onnxruntime as ort
+from langchain_core.embeddings import Embeddings
+from transformers import AutoTokenizer
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = "models/minilm-onnx"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """MiniLM sentence embeddings served by an int8 ONNX Runtime session"""
+    
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, model_file: str = QUANTIZED_MODEL_FILE,
+                 batch_size: int = 32, max_length: int = 256, num_threads: int = 0):
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads  # 0 lets ORT use every core
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            options,
+            providers=['CPUExecutionProvider']
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Mean-pool and L2-normalize token embeddings, as sentence-transformers does
+        """
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+        token_embeddings = self.session.run(None, feeds)[0]
+        
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a list of texts in batches"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]).tolist())
+        return vectors
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a single query"""
+        return self._encode([text])[0].tolist()
+
+def export_quantized_model(output_dir: str = ONNX_MODEL_DIR):
+    """
+    Export MiniLM to ONNX with O3 graph optimizations, then quantize weights to int8
+    """
+    from optimum.exporters.onnx import main_export
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    main_export(
+        MODEL_NAME,
+        output=output_dir,
+        task="feature-extraction",
+        optimize="O3"
+    )
+    
+    quantize_dynamic(
+        os.path.join(output_dir, "model.onnx"),
+        os.path.join(output_dir, QUANTIZED_MODEL_FILE),
+        weight_type=QuantType.QInt8
+    )
+    
+    print(f"Saved quantized model to {output_dir}")
+
+if __name__ == "__main__":
+    export_quantized_model(sys.argv[1] if len(sys.argv) > 1 else ONNX_MODEL_DIR)
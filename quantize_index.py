@@ -0,0 +1,53 @@
+"""
+Rebuild the FAISS vector store with an 8-bit scalar-quantized IVF index
+
+Usage: python quantize_index.py [source_dir] [target_dir]
+
+The source store is left untouched; swap the target into models/vectorstore
+once it has been checked.
+"""
+
+import sys
+import faiss
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.vectorstores import FAISS
+
+def quantize_vectorstore(source_dir: str, target_dir: str, factory: str = None):
+    """
+    Convert a flat FP32 vector store into an IVF-SQ8 one and save it
+    """
+    embeddings = HuggingFaceEmbeddings(
+        model_name="sentence-transformers/all-MiniLM-L6-v2",
+        model_kwargs={'device': 'cpu'}
+    )
+    
+    vectorstore = FAISS.load_local(
+        source_dir,
+        embeddings,
+        allow_dangerous_deserialization=True
+    )
+    
+    # Pull the raw vectors back out of the flat index
+    flat_index = vectorstore.index
+    xb = flat_index.reconstruct_n(0, flat_index.ntotal)
+    
+    # FAISS wants at least 39 training points per centroid
+    if factory is None:
+        nlist = max(1, min(1024, flat_index.ntotal // 39))
+        factory = f"IVF{nlist},SQ8"
+    
+    # Keep the original metric so scores stay comparable
+    index = faiss.index_factory(flat_index.d, factory, flat_index.metric_type)
+    index.train(xb)
+    index.add(xb)
+    
+    # Docstore ids map to positions, which are unchanged
+    vectorstore.index = index
+    vectorstore.save_local(target_dir)
+    
+    print(f"Saved {factory} index with {index.ntotal} vectors to {target_dir}")
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "models/vectorstore"
+    target = sys.argv[2] if len(sys.argv) > 2 else "models/vectorstore_sq8"
+    quantize_vectorstore(source, target)